@@ -1,16 +1,22 @@
+import asyncio
+import aiohttp
 import socketio
-import requests
 import time
 import os
 import hashlib
-import hmac
-import threading
-import json
+import orjson
 import math
 import logging
+import logging.handlers
+import queue
 import random
+import socket
+import sys
+from collections import namedtuple
 from dotenv import load_dotenv
+from http.client import HTTPSConnection, HTTPException
 from pathlib import Path
+from types import SimpleNamespace
 
 # ================= ENV =================
 load_dotenv(Path(__file__).parent / ".env")
@@ -22,7 +28,9 @@ if not API_KEY or not API_SECRET:
     raise Exception("❌ API keys missing. Check your .env file.")
 
 BASE_URL = "https://fapi.pi42.com"
+API_HOST = "fapi.pi42.com"
 WS_URL   = "https://fawss.pi42.com/"
+USER_WS_URL = "https://fawss-uds.pi42.com/"   # authenticated order/position stream, namespace /auth-<listenKey>
 
 # ================= CONFIG =================
 SYMBOLS = ["XPTINR" , "XPDINR"]
@@ -32,10 +40,18 @@ CAPITAL_PER_TRADE = 15000
 DROP_PERCENT           = 3       # price must DROP this % below lowest TP sell to trigger averaging
 TP_PERCENT             = 1.5
 TRADE_COOLDOWN         = 20      # seconds between trades per symbol
-POSITION_SYNC_INTERVAL = 5       # seconds
-ORDER_SYNC_INTERVAL    = 8       # seconds
+RECONCILE_INTERVAL     = 60      # seconds, REST safety net behind the user-data stream
+FALLBACK_POLL_INTERVAL = 5       # seconds, REST poll while the user-data stream is down (< TRADE_COOLDOWN)
+FILL_CONFIRM_TIMEOUT   = 60      # seconds a fill may stay unseen in REST before it is given up on
+REST_KEEPALIVE         = RECONCILE_INTERVAL + 15   # idle REST connections outlive the slowest poll
+LISTEN_KEY_REFRESH     = 1800    # seconds between listen-key keep-alives
+LOGIC_DEBOUNCE         = 0.05    # seconds between first-entry trade_logic runs per symbol
 MAX_RETRIES            = 3       # API call retries
 REQUEST_TIMEOUT        = 10      # seconds
+ORDER_CONN_MAX_IDLE    = 50      # seconds an order connection may idle before it is reopened
+CPU_AFFINITY           = {2, 3}  # cores to pin the process to (None disables)
+SOCKET_BUFFER_BYTES    = 1 << 20 # SO_RCVBUF / SO_SNDBUF for REST and WS sockets
+DASHBOARD_MIN_INTERVAL = 1       # seconds between dashboard redraws
 
 MIN_QTY = {
     "XPTINR": 0.005,
@@ -43,67 +59,166 @@ MIN_QTY = {
 }
 
 # ================= LOGGING =================
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
+# Callers only enqueue records; log_listener's thread does the stderr write,
+# so logging never blocks the event loop on I/O
+_log_stream = logging.StreamHandler(sys.stderr)
+_log_stream.setFormatter(logging.Formatter(
+    "%(asctime)s | %(levelname)s | %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S"
-)
-log = logging.getLogger(__name__)
+))
+_log_queue   = queue.SimpleQueue()
+_log_handler = logging.handlers.QueueHandler(_log_queue)
+_log_handler.setFormatter(logging.Formatter("%(message)s"))   # final format is applied by _log_stream
+
+logging.basicConfig(level=logging.INFO, handlers=[_log_handler])
+log          = logging.getLogger(__name__)
+log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
 
 # ================= STATE =================
-sio = socketio.Client(reconnection=True)
+# socketio/engineio take a json-like module; orjson needs a shim since it
+# returns bytes and does not accept json.dumps' separators= argument
+ORJSON_CODEC = SimpleNamespace(
+    dumps=lambda obj, **kwargs: orjson.dumps(obj).decode(),
+    loads=orjson.loads,
+)
+
+sio  = socketio.AsyncClient(reconnection=True, json=ORJSON_CODEC)
+# No auto-reconnect: start_user_ws() reconnects itself so every new
+# connection gets a fresh listen key and a REST reconcile
+user_sio = socketio.AsyncClient(reconnection=False, json=ORJSON_CODEC)
+http = None   # shared keep-alive aiohttp.ClientSession, created in main()
 
 prices             = {s: None  for s in SYMBOLS}
 positions          = {s: None  for s in SYMBOLS}
-open_orders_cache  = {s: []    for s in SYMBOLS}
-last_trade         = {s: 0     for s in SYMBOLS}
+# Order-derived state per symbol. Never mutated: writers build a new
+# SymState and rebind STATE[sym] in one store, so a reader doing
+# `st = STATE[sym]` always sees orders, lowest_sell and trigger that agree
+SymState           = namedtuple("SymState", "orders lowest_sell trigger")
+STATE              = {s: SymState((), None, None) for s in SYMBOLS}
+last_trade         = {s: float("-inf") for s in SYMBOLS}   # time.monotonic() of last order
+last_logic_ts      = {s: 0.0   for s in SYMBOLS}
+# False once trade_logic has nothing to do until orders/positions change;
+# lets on_price skip trade_logic entirely on most ticks
+armed              = {s: True  for s in SYMBOLS}
 last_trigger_price = {s: None  for s in SYMBOLS}
-active_order_flag  = {s: False for s in SYMBOLS}
+# time.monotonic() of a successful order not yet reflected in positions/orders;
+# trade_logic holds the symbol until then so stale state can't re-buy
+fill_pending_since = {s: None  for s in SYMBOLS}
+# time.monotonic() of the last user-stream update; a REST snapshot requested
+# before it is older than what we hold and must not overwrite it
+positions_stream_ts = {s: float("-inf") for s in SYMBOLS}
+orders_stream_ts    = {s: float("-inf") for s in SYMBOLS}
 positions_ready    = False
 
 # Track placed order IDs to prevent duplicates (Pi42 idempotency key)
 placed_order_ids   = {s: set() for s in SYMBOLS}
 
-lock = threading.Lock()
+# Set whenever prices, orders or positions change; dashboard_loop redraws on it
+REDRAW = asyncio.Event()
+# Set to make reconcile_loop sync now instead of at its next interval
+RECONCILE_NOW = asyncio.Event()
+
+# Everything runs on one asyncio event loop, so shared state needs no lock:
+# code between two `await`s is never interleaved with another task.
 
 # ================= HELPERS =================
-def generate_signature(secret, message):
-    return hmac.new(
-        secret.encode(),
-        message.encode(),
-        hashlib.sha256
-    ).hexdigest()
+API_SECRET_BYTES = API_SECRET.encode()
+
+# HMAC-SHA256 (RFC 2104) built directly on hashlib: the inner/outer pad
+# states are hashed once at import and copied per signature, so signing
+# stays in OpenSSL's SHA256 (SHA-NI where available) without the
+# pure-Python hmac wrapper
+_SHA256_BLOCK = 64
+_key = API_SECRET_BYTES
+if len(_key) > _SHA256_BLOCK:
+    _key = hashlib.sha256(_key).digest()
+_key = _key.ljust(_SHA256_BLOCK, b"\0")
+
+_IPAD_CTX = hashlib.sha256(bytes(b ^ 0x36 for b in _key))
+_OPAD_CTX = hashlib.sha256(bytes(b ^ 0x5C for b in _key))
+del _key
+
+
+def generate_signature(message):
+    """HMAC-SHA256 hex digest of message (bytes)."""
+    inner = _IPAD_CTX.copy()
+    inner.update(message)
+    outer = _OPAD_CTX.copy()
+    outer.update(inner.digest())
+    return outer.hexdigest()
 
 
 def sign(query):
-    return hmac.new(
-        API_SECRET.encode(),
-        query.encode(),
-        hashlib.sha256
-    ).hexdigest()
+    return generate_signature(query.encode())
+
 
+async def safe_request(method, url, **kwargs):
+    """Retries failed HTTP requests up to MAX_RETRIES times.
 
-def safe_request(method, url, **kwargs):
-    """Retries failed HTTP requests up to MAX_RETRIES times."""
+    The body is read before returning, so ``await resp.json()`` /
+    ``await resp.text()`` remain usable after the connection is released.
+    """
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            resp = requests.request(
-                method, url, timeout=REQUEST_TIMEOUT, **kwargs
-            )
-            return resp
-        except requests.RequestException as e:
+            async with http.request(method, url, **kwargs) as resp:
+                await resp.read()
+                return resp
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             log.warning(f"Request failed (attempt {attempt}/{MAX_RETRIES}): {e}")
             if attempt < MAX_RETRIES:
-                time.sleep(2 ** attempt)   # exponential back-off
+                await asyncio.sleep(2 ** attempt)   # exponential back-off
     return None
 
 
-def normalize_price(sym, price):
-    if sym.endswith("INR"):
-        return int(round(price))
+async def response_text(resp):
+    return await resp.text() if resp is not None else "no response"
+
+
+def tune_socket(sock):
+    """TCP_NODELAY, SO_KEEPALIVE and larger buffers; used for every REST, WS and order socket."""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # Best set before connect so the TCP window scale is negotiated accordingly
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_BYTES)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_BYTES)
+    if hasattr(socket, "TCP_KEEPIDLE"):   # Linux: probe idle links after 30s, not 2h
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+
+
+def tuned_socket(addr_info):
+    """aiohttp socket_factory returning a tune_socket()-ed socket."""
+    family, type_, proto, _, _ = addr_info
+    sock = socket.socket(family=family, type=type_, proto=proto)
+    tune_socket(sock)
+    return sock
+
+
+def pin_cpus():
+    """Pin the process to CPU_AFFINITY (Linux only), limited to cores that exist."""
+    if not CPU_AFFINITY or not hasattr(os, "sched_setaffinity"):
+        return
+    cpus = CPU_AFFINITY & os.sched_getaffinity(0)
+    if not cpus:
+        log.warning(f"CPU_AFFINITY {sorted(CPU_AFFINITY)} not available, not pinning")
+        return
+    os.sched_setaffinity(0, cpus)
+    log.info(f"Pinned to CPUs {sorted(cpus)}")
+
+
+def round_inr(price):
+    return int(price + 0.5)   # half-up; prices are always positive
+
+
+def round_2dp(price):
     return round(price, 2)
 
 
+# Per-symbol price normalizer, picked once instead of checking the suffix per call
+NORMALIZER = {s: round_inr if s.endswith("INR") else round_2dp for s in SYMBOLS}
+
+
 def calculate_order_qty(sym):
     price = prices.get(sym)
     if not price:
@@ -123,42 +238,64 @@ def generate_client_order_id(sym):
 
 def verify_order_placed(sym, client_order_id):
     """Verify if an order with given client order ID was already placed."""
-    with lock:
-        return client_order_id in placed_order_ids[sym]
+    return client_order_id in placed_order_ids[sym]
 
 
 def mark_order_placed(sym, client_order_id):
     """Mark an order as placed to prevent duplicates."""
-    with lock:
-        placed_order_ids[sym].add(client_order_id)
-        # Keep only last 100 order IDs to prevent memory leak
-        if len(placed_order_ids[sym]) > 100:
-            # Remove oldest entries
-            old_ids = list(placed_order_ids[sym])[:50]
-            for old_id in old_ids:
-                placed_order_ids[sym].discard(old_id)
+    placed_order_ids[sym].add(client_order_id)
+    # Keep only last 100 order IDs to prevent memory leak
+    if len(placed_order_ids[sym]) > 100:
+        # Remove oldest entries
+        old_ids = list(placed_order_ids[sym])[:50]
+        for old_id in old_ids:
+            placed_order_ids[sym].discard(old_id)
 
 # ================= SYNC POSITIONS =================
-def sync_positions():
+async def fetch_open_positions(symbol=None):
+    """GET open positions, for one symbol or (symbol=None) all of them. Returns a list or None."""
+    ts      = str(int(time.time() * 1000))
+    query   = f"symbol={symbol}&timestamp={ts}" if symbol else f"timestamp={ts}"
+    headers = {"signature": sign(query)}
+    resp    = await safe_request("GET", f"{BASE_URL}/v1/positions/OPEN?{query}", headers=headers)
+
+    if resp and resp.status == 200:
+        return await resp.json(content_type=None)
+
+    log.error(f"Position sync failed for {symbol or 'all symbols'}: {await response_text(resp)}")
+    return None
+
+
+async def sync_positions():
     global positions_ready
+    started = time.monotonic()
     try:
-        ts     = str(int(time.time() * 1000))
-        loaded = 0
+        # One request for every symbol, filtered client-side
+        data = await fetch_open_positions()
+        if data is not None:
+            by_pair = {p["contractPair"]: p for p in data if p["contractPair"] in positions}
+            for sym in SYMBOLS:
+                if positions_stream_ts[sym] < started:   # else the stream is newer
+                    positions[sym] = by_pair.get(sym)
+                    armed[sym]     = True
+                check_fill_seen(sym, started)
+            positions_ready = True
+            REDRAW.set()
+            return
 
+        # Fall back to one request per symbol
+        loaded = 0
         for sym in SYMBOLS:
-            query   = f"symbol={sym}&timestamp={ts}"
-            headers = {"api-key": API_KEY, "signature": sign(query)}
-            resp    = safe_request("GET", f"{BASE_URL}/v1/positions/OPEN?{query}", headers=headers)
-
-            if resp and resp.status_code == 200:
-                data = resp.json()
-                with lock:
+            data = await fetch_open_positions(sym)
+            if data is not None:
+                if positions_stream_ts[sym] < started:
                     positions[sym] = next(
                         (p for p in data if p["contractPair"] == sym), None
                     )
+                    armed[sym] = True
+                check_fill_seen(sym, started)
                 loaded += 1
-            else:
-                log.error(f"Position sync failed for {sym}: {getattr(resp, 'text', 'no response')}")
+        REDRAW.set()
 
         if loaded == len(SYMBOLS):
             positions_ready = True
@@ -166,306 +303,591 @@ def sync_positions():
     except Exception as e:
         log.error(f"Position sync error: {e}")
 
+# ================= ORDER CACHE =================
+async def sync_open_orders():
+    started = time.monotonic()
+    try:
+        ts      = str(int(time.time() * 1000))
+        query   = f"timestamp={ts}"
+        headers = {"signature": sign(query)}
+        resp    = await safe_request("GET", f"{BASE_URL}/v1/order/open-orders?{query}", headers=headers)
 
-def position_sync_loop():
-    while True:
-        sync_positions()
-        time.sleep(POSITION_SYNC_INTERVAL)
+        if resp and resp.status == 200:
+            data = await resp.json(content_type=None)
+            for sym in SYMBOLS:
+                if orders_stream_ts[sym] < started:   # else the stream is newer
+                    set_open_orders(sym, [
+                        o for o in data
+                        if  o["symbol"] == sym
+                        and o.get("side") == "SELL"
+                    ])
+                check_fill_seen(sym, started)
+        else:
+            log.warning("Open orders fetch returned unexpected response.")
 
-# ================= ORDER CACHE =================
-def fetch_open_orders_loop():
+    except Exception as e:
+        log.error(f"Order fetch error: {e}")
+
+
+async def reconcile():
+    await sync_positions()
+    await sync_open_orders()
+
+
+async def reconcile_loop():
+    """REST poll behind the user-data stream.
+
+    Runs every RECONCILE_INTERVAL while the stream is connected, and every
+    FALLBACK_POLL_INTERVAL while it is not, so state is never staler than
+    TRADE_COOLDOWN when the stream is down. RECONCILE_NOW forces an
+    immediate sync (e.g. after a fill).
+    """
+    last = time.monotonic()
     while True:
         try:
-            ts      = str(int(time.time() * 1000))
-            query   = f"timestamp={ts}"
-            headers = {"api-key": API_KEY, "signature": sign(query)}
-            resp    = safe_request("GET", f"{BASE_URL}/v1/order/open-orders?{query}", headers=headers)
-
-            if resp and resp.status_code == 200:
-                data = resp.json()
-                with lock:
-                    for sym in SYMBOLS:
-                        open_orders_cache[sym] = [
-                            o for o in data
-                            if  o["symbol"] == sym
-                            and o.get("side") == "SELL"
-                        ]
-            else:
-                log.warning("Open orders fetch returned unexpected response.")
+            await asyncio.wait_for(RECONCILE_NOW.wait(), timeout=FALLBACK_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            if user_sio.connected and time.monotonic() - last < RECONCILE_INTERVAL:
+                continue
+        RECONCILE_NOW.clear()
+        await reconcile()
+        last = time.monotonic()
+
+
+def check_fill_seen(sym, snapshot_started):
+    """Release sym's post-fill hold once a REST snapshot reflects the fill.
+
+    The snapshot must have been requested after the fill and show a position
+    or open orders; if it still shows neither after FILL_CONFIRM_TIMEOUT the
+    hold is dropped anyway.
+    """
+    since = fill_pending_since[sym]
+    if since is None or snapshot_started < since:
+        return
+    if positions[sym] or STATE[sym].orders:
+        fill_pending_since[sym] = None
+    elif snapshot_started - since > FILL_CONFIRM_TIMEOUT:
+        log.warning(f"⚠️ {sym} fill not visible after {FILL_CONFIRM_TIMEOUT}s, releasing hold")
+        fill_pending_since[sym] = None
+
+
+def set_open_orders(sym, orders):
+    """Replace sym's open SELL orders and recompute lowest TP sell and trigger.
+
+    The per-tick path then only has to read the cached values.
+    """
+    orders = tuple(orders)
+    lowest = min(
+        (float(o["price"]) for o in orders if o.get("price")),
+        default=None,
+    )
+    trigger = NORMALIZER[sym](lowest * (1 - DROP_PERCENT / 100)) if lowest else None
+    STATE[sym] = SymState(orders, lowest, trigger)
+    armed[sym] = True
+    REDRAW.set()
 
-        except Exception as e:
-            log.error(f"Order fetch error: {e}")
 
-        time.sleep(ORDER_SYNC_INTERVAL)
+def get_trigger_price(sym):
+    return STATE[sym].trigger
+
+# ================= PLACE LONG =================
+ORDER_PATH = "/v1/order/place-order"
+
+# Exact compact JSON of a market-buy order; only timestamp, quantity,
+# takeProfitPrice and clientOrderId (the idempotency key) vary, so each
+# order is a single %-format. The signature covers these exact bytes.
+ORDER_TEMPLATE = {
+    s: (
+        '{"timestamp":"%s","placeType":"ORDER_FORM","quantity":%r,"side":"BUY",'
+        '"price":0,"symbol":"' + s + '","type":"MARKET","reduceOnly":false,'
+        '"marginAsset":"INR","deviceType":"WEB","userCategory":"EXTERNAL",'
+        '"takeProfitPrice":%r,"clientOrderId":"%s"}'
+    )
+    for s in SYMBOLS
+}
+
 
+def new_order_conn():
+    conn = HTTPSConnection(API_HOST, timeout=REQUEST_TIMEOUT)
+    conn.last_used = float("-inf")   # time.monotonic() of the last successful exchange
+    return conn
 
-def get_lowest_open_sell(sym):
-    sell_prices = [
-        float(o["price"])
-        for o in open_orders_cache.get(sym, [])
-        if o.get("price")
-    ]
-    return min(sell_prices) if sell_prices else None
 
-# ================= PLACE LONG =================
-def place_long(sym, client_order_id=None):
-    """Places a market buy with an inline TP sell. Returns True on success."""
+def open_order_conn(conn):
+    """Blocking (re)connect of an order connection with tune_socket() options."""
+    conn.close()
+    conn.connect()
+    tune_socket(conn.sock)
+    conn.last_used = time.monotonic()
+
+
+def post_order(conn, body, headers):
+    """Blocking POST of a signed order on a persistent HTTPSConnection.
+
+    Returns (status, body bytes). A connection idle for longer than
+    ORDER_CONN_MAX_IDLE is reopened first rather than trusted. If the
+    server still turns out to have dropped it, it is reopened and the
+    request retried once; the clientOrderId in the body keeps the retry
+    idempotent. A timeout is never retried, since the order may have
+    been received.
+    """
+    if conn.sock is None or time.monotonic() - conn.last_used > ORDER_CONN_MAX_IDLE:
+        open_order_conn(conn)
+
+    for attempt in (1, 2):
+        try:
+            conn.request("POST", ORDER_PATH, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            conn.last_used = time.monotonic()
+            return resp.status, data
+        except TimeoutError:
+            conn.close()
+            raise
+        except (HTTPException, OSError):
+            conn.close()
+            if attempt == 2:
+                raise
+            open_order_conn(conn)
+
+
+async def place_long(sym, conn, client_order_id=None):
+    """Places a market buy with an inline TP sell. Returns (success, client_order_id)."""
     entry = prices[sym]
     if entry is None:
-        return False
+        return False, client_order_id
 
-    tp    = normalize_price(sym, entry * (1 + TP_PERCENT / 100))
-    entry = normalize_price(sym, entry)
+    tp    = NORMALIZER[sym](entry * (1 + TP_PERCENT / 100))
+    entry = NORMALIZER[sym](entry)
     qty   = calculate_order_qty(sym)
 
     if not qty:
         log.error(f"❌ Could not calculate qty for {sym}")
-        return False
+        return False, client_order_id
 
     # Generate client order ID if not provided (for idempotency)
     if not client_order_id:
         client_order_id = generate_client_order_id(sym)
 
-    params = {
-        "timestamp":       str(int(time.time() * 1000)),
-        "placeType":       "ORDER_FORM",
-        "quantity":        qty,
-        "side":            "BUY",
-        "price":           0,
-        "symbol":          sym,
-        "type":            "MARKET",
-        "reduceOnly":      False,
-        "marginAsset":     "INR",
-        "deviceType":      "WEB",
-        "userCategory":    "EXTERNAL",
-        "takeProfitPrice": tp,
-        "clientOrderId":   client_order_id  # Idempotency key to prevent duplicates
-    }
-
-    body      = json.dumps(params, separators=(',', ':'))
-    signature = generate_signature(API_SECRET, body)
+    body      = (ORDER_TEMPLATE[sym] % (int(time.time() * 1000), qty, tp, client_order_id)).encode()
+    signature = generate_signature(body)
     headers   = {
         "api-key":      API_KEY,
         "signature":    signature,
         "Content-Type": "application/json"
     }
 
-    resp = safe_request("POST", f"{BASE_URL}/v1/order/place-order", headers=headers, data=body)
-
-    if not resp:
-        log.error(f"❌ Long order failed {sym}: no response")
+    # Raw http.client on a dedicated connection skips the aiohttp request
+    # machinery; it runs in a thread so the event loop is never blocked
+    try:
+        status, text = await asyncio.to_thread(post_order, conn, body, headers)
+    except (HTTPException, OSError) as e:
+        log.error(f"❌ Long order failed {sym}: {e}")
         return False, client_order_id
 
-    if resp.status_code == 200:
+    if status == 200:
         # Mark order as placed to prevent duplicates
         mark_order_placed(sym, client_order_id)
         log.info(f"🟢 LONG  {sym} | Entry: {entry} | TP: {tp} | Qty: {qty} | ClientID: {client_order_id}")
         return True, client_order_id
 
-    log.error(f"❌ Long order rejected {sym}: {resp.text}")
+    log.error(f"❌ Long order rejected {sym}: {text.decode(errors='replace')}")
     return False, client_order_id
 
 # ================= TRADE LOGIC =================
 # Track pending orders to prevent duplicates
 pending_orders = {s: False for s in SYMBOLS}
 
-def trade_logic(sym):
-    global pending_orders
-    
-    # Read shared state under lock, then release before any HTTP call
-    with lock:
-        if not positions_ready:
-            return
-        if prices[sym] is None:
-            return
-        if active_order_flag[sym]:
-            return
-        if pending_orders[sym]:  # Don't place if order is pending confirmation
-            return
-        if time.time() - last_trade[sym] < TRADE_COOLDOWN:
-            return
+# Orders are signed and sent by order_worker tasks; the price handler only
+# decides and enqueues (sym, client_order_id, trigger)
+ORDER_Q = asyncio.Queue()
+
 
-        pos = positions.get(sym)
-        if pos and float(pos.get("quantity", 0)) == 0:
-            positions[sym] = None
-            pos = None
+def enqueue_order(sym, trigger=None):
+    # Generate client order ID BEFORE placing to prevent duplicates
+    client_order_id = generate_client_order_id(sym)
 
-        current_price = prices[sym]
-        orders        = list(open_orders_cache[sym])   # snapshot
-        active_order_flag[sym] = True                  # reserve slot
+    # Check if this exact order was already placed
+    if verify_order_placed(sym, client_order_id):
+        log.warning(f"⚠️ Order already placed for {sym}, skipping")
+        return
 
-    # ── All HTTP work happens OUTSIDE the lock ──────────────────────────
+    # Mark as pending and start the cooldown now, not after the HTTP response
+    armed[sym]          = False
+    pending_orders[sym] = True
+    last_trade[sym]     = time.monotonic()
+    ORDER_Q.put_nowait((sym, client_order_id, trigger))
+
+
+async def order_worker():
+    # Each worker owns its connection, so it is never used by two threads.
+    # It is (re)opened up front and whenever it has idled ORDER_CONN_MAX_IDLE,
+    # so an order neither pays for the TLS handshake nor hits a dead socket
+    conn = new_order_conn()
     try:
-        # FIRST ENTRY
-        if not pos:
-            if orders:
-                return
-            log.info(f"📈 Opening FIRST LONG {sym}")
-            
-            # Generate client order ID BEFORE placing to prevent duplicates
-            client_order_id = generate_client_order_id(sym)
-            
-            # Check if this exact order was already placed
-            if verify_order_placed(sym, client_order_id):
-                log.warning(f"⚠️ Order already placed for {sym}, skipping")
-                return
-            
-            # Mark as pending BEFORE placing order
-            with lock:
-                pending_orders[sym] = True
-            
-            success, _ = place_long(sym, client_order_id)
-            with lock:
+        while True:
+            if time.monotonic() - conn.last_used >= ORDER_CONN_MAX_IDLE:
+                try:
+                    await asyncio.to_thread(open_order_conn, conn)
+                except (HTTPException, OSError) as e:
+                    log.warning(f"Order connection refresh failed: {e}")
+                    conn.last_used = time.monotonic()   # don't retry in a tight loop
+
+            try:
+                sym, client_order_id, trigger = await asyncio.wait_for(
+                    ORDER_Q.get(), timeout=ORDER_CONN_MAX_IDLE
+                )
+            except asyncio.TimeoutError:
+                continue
+
+            try:
+                success, _ = await place_long(sym, conn, client_order_id)
                 if success:
-                    last_trade[sym] = time.time()
+                    if trigger is not None:
+                        last_trigger_price[sym] = trigger
+                    # Hold the symbol until the fill is seen, and have
+                    # reconcile_loop go look for it without tying up this worker
+                    fill_pending_since[sym] = time.monotonic()
+                    RECONCILE_NOW.set()
+            except Exception as e:
+                log.error(f"Order worker error for {sym}: {e}")
+            finally:
                 pending_orders[sym] = False  # Clear pending after response
-            return
+                armed[sym]          = True
+                ORDER_Q.task_done()
+    finally:
+        conn.close()
+
 
-        # LADDER ENTRY
-        lowest_sell = get_lowest_open_sell(sym)
-        if not lowest_sell:
+def trade_logic(sym):
+    if not positions_ready:
+        return
+    if prices[sym] is None:
+        return
+    if pending_orders[sym]:  # Don't place if order is pending confirmation
+        return
+    if fill_pending_since[sym] is not None:
+        armed[sym] = False   # re-armed when the fill shows up in positions/orders
+        return
+    if time.monotonic() - last_trade[sym] < TRADE_COOLDOWN:
+        return
+
+    pos = positions.get(sym)
+    if pos and float(pos.get("quantity", 0)) == 0:
+        positions[sym] = None
+        pos = None
+
+    # FIRST ENTRY
+    if not pos:
+        if STATE[sym].orders:
+            armed[sym] = False   # wait for the orders/position to change
             return
+        log.info(f"📈 Opening FIRST LONG {sym}")
+        enqueue_order(sym)
+        return
 
-        trigger = normalize_price(sym, lowest_sell * (1 - DROP_PERCENT / 100))
+    # LADDER ENTRY
+    trigger = get_trigger_price(sym)
+    if not trigger or last_trigger_price[sym] == trigger:
+        armed[sym] = False   # nothing to do until the orders change
+        return
 
-        with lock:
-            if last_trigger_price[sym] == trigger:
-                return
+    if prices[sym] <= trigger:
+        log.info(f"📉 {sym} Drop trigger hit → Averaging LONG")
+        enqueue_order(sym, trigger)
 
-        if current_price <= trigger:
-            log.info(f"📉 {sym} Drop trigger hit → Averaging LONG")
-            
-            # Generate client order ID BEFORE placing to prevent duplicates
-            client_order_id = generate_client_order_id(sym)
-            
-            # Check if this exact order was already placed
-            if verify_order_placed(sym, client_order_id):
-                log.warning(f"⚠️ Order already placed for {sym}, skipping")
-                return
-            
-            # Mark as pending BEFORE placing order
-            with lock:
-                pending_orders[sym] = True
-            
-            success, _ = place_long(sym, client_order_id)
-            with lock:
-                if success:
-                    last_trade[sym]         = time.time()
-                    last_trigger_price[sym] = trigger
-                pending_orders[sym] = False  # Clear pending after response
+# ================= DASHBOARD =================
+def render_dashboard():
+    lines = [
+        "\n" * 2,
+        "=" * 80,
+        "🔥 PI42 LONG ENGINE - LIVE DASHBOARD 🔥",
+        "=" * 80,
+    ]
 
-    finally:
-        with lock:
-            active_order_flag[sym] = False
+    total_unrealized = 0
+    total_exposure   = 0
+
+    for sym in SYMBOLS:
+        price = prices.get(sym)
+        pos   = positions.get(sym)
+
+        lines += [
+            "\n------------------------------------------------------------",
+            f"SYMBOL: {sym}",
+            "------------------------------------------------------------",
+            f"Mark Price        : {price}",
+        ]
+
+        if not pos or not price:
+            lines.append("Position          : None")
+            continue
+
+        size  = float(pos["quantity"])
+        entry = float(pos["entryPrice"])
+
+        unrealized = (price - entry) * abs(size)
+        exposure   = abs(size) * price
+
+        st       = STATE[sym]   # one consistent snapshot
+        tp_price = NORMALIZER[sym](entry * (1 + TP_PERCENT / 100))
+
+        lines += [
+            f"Direction         : LONG",
+            f"Position Size     : {size}",
+            f"Entry Price       : {entry}",
+            f"Take Profit       : {tp_price}",
+            f"Unrealized PnL    : {round(unrealized, 4)}",
+            f"Current Exposure  : {round(exposure, 4)}",
+            f"Lowest SELL TP    : {st.lowest_sell}",
+            f"Next Trigger      : {st.trigger}",
+        ]
+
+        total_unrealized += unrealized
+        total_exposure   += exposure
+
+    lines += [
+        "\n============================================================",
+        "PORTFOLIO SUMMARY",
+        "============================================================",
+        f"Total Unrealized PnL : {round(total_unrealized, 4)}",
+        f"Total Exposure       : {round(total_exposure, 4)}",
+        "=" * 80,
+    ]
+    return "\n".join(lines) + "\n"
 
-# ================= DASHBOARD =================
-def dashboard_loop():
+
+async def dashboard_loop():
+    # Idle until something changes, then redraw at most once per
+    # DASHBOARD_MIN_INTERVAL; changes during the pause coalesce into one set()
     while True:
-        time.sleep(5)
+        await REDRAW.wait()
+        REDRAW.clear()
+        try:
+            sys.stdout.write(render_dashboard())   # one write + flush per redraw
+            sys.stdout.flush()
+        except Exception as e:
+            log.error(f"Dashboard error: {e}")
+        await asyncio.sleep(DASHBOARD_MIN_INTERVAL)
 
-        print("\n" * 2)
-        print("=" * 80)
-        print("🔥 PI42 LONG ENGINE - LIVE DASHBOARD 🔥")
-        print("=" * 80)
+# ================= WEBSOCKET =================
+WS_SUB_PARAMS = [f"{s.lower()}@markPrice" for s in SYMBOLS]
 
-        total_unrealized = 0
-        total_exposure   = 0
+# Feed symbol -> SYMBOLS entry; accepts either case so ticks need no .upper()
+WS_SYMBOL_MAP = {k: s for s in SYMBOLS for k in (s, s.lower())}
 
-        with lock:
-            for sym in SYMBOLS:
-                price = prices.get(sym)
-                pos   = positions.get(sym)
-
-                print("\n------------------------------------------------------------")
-                print(f"SYMBOL: {sym}")
-                print("------------------------------------------------------------")
-                print(f"Mark Price        : {price}")
-
-                if not pos or not price:
-                    print("Position          : None")
-                    continue
-
-                size  = float(pos["quantity"])
-                entry = float(pos["entryPrice"])
-
-                unrealized = (price - entry) * abs(size)
-                exposure   = abs(size) * price
-
-                lowest_sell = get_lowest_open_sell(sym)
-                trigger     = None
-                if lowest_sell:
-                    trigger = normalize_price(sym, lowest_sell * (1 - DROP_PERCENT / 100))
-
-                tp_price = normalize_price(sym, entry * (1 + TP_PERCENT / 100))
-
-                print(f"Direction         : LONG")
-                print(f"Position Size     : {size}")
-                print(f"Entry Price       : {entry}")
-                print(f"Take Profit       : {tp_price}")
-                print(f"Unrealized PnL    : {round(unrealized, 4)}")
-                print(f"Current Exposure  : {round(exposure, 4)}")
-                print(f"Lowest SELL TP    : {lowest_sell}")
-                print(f"Next Trigger      : {trigger}")
-
-                total_unrealized += unrealized
-                total_exposure   += exposure
-
-        print("\n============================================================")
-        print("PORTFOLIO SUMMARY")
-        print("============================================================")
-        print(f"Total Unrealized PnL : {round(total_unrealized, 4)}")
-        print(f"Total Exposure       : {round(total_exposure, 4)}")
-        print("=" * 80)
 
-# ================= WEBSOCKET =================
 @sio.event
-def connect():
+async def connect():
     log.info("✅ WebSocket connected & subscribed")
-    sio.emit(
+    await sio.emit(
         "subscribe",
-        {"params": [f"{s.lower()}@markPrice" for s in SYMBOLS]}
+        {"params": WS_SUB_PARAMS}
     )
 
 
 @sio.on("markPriceUpdate")
-def on_price(data):
+async def on_price(data):
     try:
-        sym   = data.get("s", "").upper()
+        sym   = WS_SYMBOL_MAP.get(data.get("s"))
         price = data.get("p")
-        if sym in SYMBOLS and price:
-            prices[sym] = float(price)
-            threading.Thread(target=trade_logic, args=(sym,), daemon=True).start()
+        if sym and price:
+            if type(price) is not float:   # feed may send numbers as strings
+                price = float(price)
+            prices[sym] = price
+            REDRAW.set()
+
+            # Common case: disarmed, or price still above the trigger
+            if not armed[sym]:
+                return
+            trigger = STATE[sym].trigger
+            if trigger:
+                if price > trigger:
+                    return
+            else:
+                # No trigger yet (first entry): coalesce bursts
+                now = time.monotonic()
+                if now - last_logic_ts[sym] < LOGIC_DEBOUNCE:
+                    return
+                last_logic_ts[sym] = now
+
+            trade_logic(sym)   # only enqueues; order_worker does the HTTP
     except Exception as e:
         log.error(f"on_price error: {e}")
 
 
 @sio.event
-def connect_error(data):
+async def connect_error(data):
     log.error(f"WebSocket connection error: {data}")
 
 
 @sio.event
-def disconnect():
+async def disconnect():
     log.warning("WebSocket disconnected")
 
 
-def start_ws():
+async def start_ws():
     while True:
         try:
             log.info("Connecting WebSocket...")
-            sio.connect(WS_URL, transports=["websocket"])
-            sio.wait()
+            await sio.connect(WS_URL, transports=["websocket"])
+            await sio.wait()
         except Exception as e:
             log.error(f"WebSocket crashed: {e}")
         log.info("Reconnecting in 5s...")
-        time.sleep(5)
+        await asyncio.sleep(5)
+
+# ================= USER DATA STREAM =================
+ORDER_OPEN_EVENTS   = ("newOrder", "updateOrder", "orderPartiallyFilled")
+ORDER_CLOSED_EVENTS = ("orderFilled", "orderCancelled", "orderFailed")
+POSITION_OPEN_EVENTS   = ("newPosition", "updatePosition")
+POSITION_CLOSED_EVENTS = ("closePosition",)
+
+
+def order_key(order):
+    return order.get("clientOrderId") or order.get("id")
+
+
+def apply_order_event(order, is_open):
+    """Add/replace (is_open) or drop an order in STATE[sym].orders."""
+    sym = order.get("symbol")
+    key = order_key(order)
+    if sym not in STATE or order.get("side") != "SELL" or key is None:
+        return
+
+    orders = [o for o in STATE[sym].orders if order_key(o) != key]
+    if is_open:
+        orders.append(order)
+    fill_pending_since[sym] = None   # the stream has caught up with our orders
+    orders_stream_ts[sym]   = time.monotonic()
+    set_open_orders(sym, orders)
+
+
+def apply_position_event(pos, is_open):
+    sym = pos.get("contractPair")
+    if sym not in positions:
+        return
+    if not is_open or float(pos.get("quantity", 0) or 0) == 0:
+        positions[sym] = None
+    else:
+        positions[sym] = pos
+    fill_pending_since[sym]  = None   # the stream has caught up with our orders
+    positions_stream_ts[sym] = time.monotonic()
+    armed[sym] = True
+    REDRAW.set()
+
+
+def register_user_handlers():
+    # The stream is the socket.io namespace /auth-<listenKey>, which changes
+    # with every key, so handlers go on the catch-all namespace; socketio
+    # then passes the namespace as the first argument
+    def make_handler(apply, is_open):
+        def handler(namespace, data):
+            try:
+                apply(data, is_open)
+            except Exception as e:
+                log.error(f"User-data event error: {e}")
+        return handler
+
+    for events, apply, is_open in (
+        (ORDER_OPEN_EVENTS,      apply_order_event,    True),
+        (ORDER_CLOSED_EVENTS,    apply_order_event,    False),
+        (POSITION_OPEN_EVENTS,   apply_position_event, True),
+        (POSITION_CLOSED_EVENTS, apply_position_event, False),
+    ):
+        for event in events:
+            user_sio.on(event, make_handler(apply, is_open), namespace="*")
+
+
+register_user_handlers()
+
+
+async def listen_key_request(method):
+    """POST creates a listen key, PUT keeps it alive. Returns the JSON reply or None."""
+    body    = orjson.dumps({"timestamp": str(int(time.time() * 1000))})
+    headers = {"signature": generate_signature(body), "Content-Type": "application/json"}
+    resp    = await safe_request(method, f"{BASE_URL}/v1/retail/listen-key", headers=headers, data=body)
+
+    if resp and resp.status == 200:
+        return await resp.json(content_type=None)
+
+    log.error(f"Listen key {method} failed: {await response_text(resp)}")
+    return None
+
+
+async def listen_key_keepalive_loop():
+    while True:
+        await asyncio.sleep(LISTEN_KEY_REFRESH)
+        await listen_key_request("PUT")
+
+
+async def start_user_ws():
+    while True:
+        keepalive = None
+        try:
+            reply = await listen_key_request("POST")
+            if reply and reply.get("listenKey"):
+                log.info("Connecting user-data WebSocket...")
+                # engineio drops URL paths; the listen key travels as the namespace
+                await user_sio.connect(
+                    USER_WS_URL,
+                    namespaces=[f"/auth-{reply['listenKey']}"],
+                    transports=["websocket"],
+                )
+                keepalive = asyncio.create_task(listen_key_keepalive_loop())
+                await reconcile()   # catch up on anything missed while disconnected
+                await user_sio.wait()
+        except Exception as e:
+            log.error(f"User-data WebSocket crashed: {e}")
+        finally:
+            if keepalive:
+                keepalive.cancel()
+            if user_sio.connected:
+                await user_sio.disconnect()
+        log.info("User-data WebSocket reconnecting in 5s...")
+        await asyncio.sleep(5)
 
 # ================= MAIN =================
-if __name__ == "__main__":
-    sync_positions()   # initial sync before threads start
+async def main():
+    global http
+    pin_cpus()   # before any thread starts, so all threads inherit it
+    log_listener.start()
+    http = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=8, ttl_dns_cache=300, keepalive_timeout=REST_KEEPALIVE, socket_factory=tuned_socket
+        ),
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        headers={"api-key": API_KEY},   # signature is the only per-call header
+    )
 
-    threading.Thread(target=position_sync_loop,    daemon=True).start()
-    threading.Thread(target=fetch_open_orders_loop, daemon=True).start()
-    threading.Thread(target=dashboard_loop,         daemon=True).start()
+    # Both WebSockets ride on a tuned session too; engineio must not close
+    # it on disconnect since it does not own it
+    ws_http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(socket_factory=tuned_socket))
+    for client in (sio, user_sio):
+        client.eio.http          = ws_http
+        client.eio.external_http = True
 
-    start_ws()
+    tasks = []   # keep references so the tasks are not garbage-collected
+    try:
+        await reconcile()   # initial sync before background tasks start
+
+        tasks = [
+            asyncio.create_task(reconcile_loop()),
+            asyncio.create_task(start_user_ws()),
+            asyncio.create_task(dashboard_loop()),
+        ]
+        # One worker per symbol: pending_orders allows at most one in-flight
+        # order per symbol, so symbols never wait on each other
+        tasks += [asyncio.create_task(order_worker()) for _ in SYMBOLS]
+
+        await start_ws()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await http.close()
+        await ws_http.close()
+        log_listener.stop()   # flushes queued records
+
+
+if __name__ == "__main__":
+    asyncio.run(main())